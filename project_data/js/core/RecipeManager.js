@@ -444,7 +444,7 @@ class RecipeManager {
                         headers: { 'Content-Type': 'application/json' },
                         body: JSON.stringify({
                             filename,
-                            data: JSON.stringify(recipeData, null, 2),
+                            data: recipeData,
                             user
                         })
                     });
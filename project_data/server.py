@@ -1,39 +1,70 @@
 import os
-import json
-import psutil
-import signal
+import asyncio
+import hashlib
+import logging
+import orjson
+import aiofiles
+import socket
+import time
 from datetime import datetime
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse, Response
+from fastapi.responses import ORJSONResponse, Response
 from pydantic import BaseModel
-from typing import List, Dict, Any
-import openai
+from typing import List, Dict, Any, Optional, Tuple
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
-import requests
 import httpx
 # Redis removed - using file-based storage only
 
+logger = logging.getLogger(__name__)
+
 # Function to kill process using port 8000
 def kill_process_on_port(port=8000):
     """Kill any process using the specified port"""
+    # Imported here so the server itself never pays for psutil
+    import psutil
+    
+    # Quick check: if the port can be bound, nothing is holding it
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        try:
+            sock.bind(('', port))
+            return False
+        except OSError:
+            pass
+    
     try:
-        for proc in psutil.process_iter(['pid', 'name', 'connections']):
+        try:
+            # One system-wide connection query instead of walking every process
+            connections = [(conn.pid, conn) for conn in psutil.net_connections(kind='inet')]
+        except psutil.AccessDenied:
+            # macOS only allows the system-wide query for root; scan our visible processes instead
+            connections = [
+                (proc.info['pid'], conn)
+                for proc in psutil.process_iter(['pid', 'connections'])
+                for conn in (proc.info['connections'] or [])
+            ]
+        
+        pids = {
+            pid for pid, conn in connections
+            if pid and conn.laddr and conn.laddr.port == port and conn.status == psutil.CONN_LISTEN
+        }
+        
+        killed = False
+        for pid in pids:
             try:
-                connections = proc.info['connections']
-                if connections:
-                    for conn in connections:
-                        if hasattr(conn, 'laddr') and conn.laddr and conn.laddr.port == port:
-                            # Skip system processes that don't actually use the port
-                            if proc.info['name'] in ['System Idle Process', 'System']:
-                                continue
-                            print(f"[INFO] Killing process {proc.info['pid']} ({proc.info['name']}) using port {port}")
-                            proc.kill()
-                            proc.wait(timeout=3)
-                            return True
-            except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
+                proc = psutil.Process(pid)
+                # Skip system processes that don't actually use the port
+                if proc.name() in ['System Idle Process', 'System']:
+                    continue
+                print(f"[INFO] Killing process {pid} ({proc.name()}) using port {port}")
+                proc.kill()
+                proc.wait(timeout=3)
+                killed = True
+            except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess, psutil.TimeoutExpired):
                 pass
+        return killed
     except Exception as e:
         print(f"[ERROR] Error killing process on port {port}: {e}")
     return False
@@ -43,7 +74,24 @@ def kill_process_on_port(port=8000):
 # Load environment variables
 load_dotenv()
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Shared OpenAI HTTP client so connections (and TLS sessions) are reused across requests.
+    # Created per lifespan so a restarted app never picks up a closed client.
+    app.state.openai_client = httpx.AsyncClient(
+        http2=True,
+        timeout=30.0,
+        limits=httpx.Limits(max_keepalive_connections=20),
+    )
+    yield
+    # Let pending metadata writes finish before shutting down, retrying failed ones once
+    if _flush_tasks:
+        await asyncio.gather(*_flush_tasks.values(), return_exceptions=True)
+    for user in list(_dirty_users):
+        await _flush_metadata(user)
+    await app.state.openai_client.aclose()
+
+app = FastAPI(default_response_class=ORJSONResponse, lifespan=lifespan)
 
 # Add CORS middleware
 app.add_middleware(
@@ -76,7 +124,7 @@ class MetadataUpdateRequest(BaseModel):
 
 class UserRecipeSaveRequest(BaseModel):
     filename: str
-    data: str
+    data: Dict[str, Any]
     user: str  # Required user parameter
 
 class RecipeDeleteRequest(BaseModel):
@@ -84,10 +132,108 @@ class RecipeDeleteRequest(BaseModel):
     recipeId: str
     user: str  # Required user parameter
 
+# ============================================================================
+# METADATA CACHE
+# ============================================================================
+
+# Parsed metadata.json per user: remaining top-level fields, plus the recipes
+# keyed by id (dicts keep insertion order, so file order is preserved).
+# Only users with a metadata.json on disk, or who have written one, are cached.
+_metadata_cache: Dict[str, Tuple[Dict[str, Any], Dict[str, Dict[str, Any]]]] = {}
+# Users whose cached metadata has changes not yet written to disk
+_dirty_users = set()
+# At most one pending flush task per user
+_flush_tasks: Dict[str, asyncio.Task] = {}
+
+def _metadata_path(user: str) -> str:
+    return os.path.join(f"../database/users/{user}/recipes", "metadata.json")
+
+async def _load_metadata(user: str, create: bool = False) -> Optional[Tuple[Dict[str, Any], Dict[str, Dict[str, Any]]]]:
+    """Return cached metadata and its recipes by id, reading disk only on a cache miss.
+
+    Returns None when the user has no metadata.json, unless create is set.
+    Callers must mutate the result before their next await so updates stay atomic.
+    """
+    cached = _metadata_cache.get(user)
+    if cached is not None:
+        return cached
+    
+    try:
+        async with aiofiles.open(_metadata_path(user), 'rb') as f:
+            metadata = orjson.loads(await f.read())
+    except FileNotFoundError:
+        if not create:
+            return None
+        metadata = {"user": user}
+    recipes = {recipe["id"]: recipe for recipe in metadata.pop("recipes", [])}
+    # Another request may have loaded this user while we were reading
+    return _metadata_cache.setdefault(user, (metadata, recipes))
+
+def _metadata_document(metadata: Dict[str, Any], recipes: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """Rebuild the metadata.json layout with recipes as a list"""
+    return {"recipes": list(recipes.values()), **metadata}
+
+async def _flush_metadata(user: str):
+    """Write a user's cached metadata to disk via tmp file + rename, until it is clean"""
+    metadata_path = _metadata_path(user)
+    tmp_path = metadata_path + ".tmp"
+    try:
+        while user in _dirty_users:
+            _dirty_users.discard(user)
+            # Snapshot before awaiting; changes made during the write re-mark the user dirty
+            metadata, recipes = _metadata_cache[user]
+            body = orjson.dumps(_metadata_document(metadata, recipes), option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+            try:
+                await asyncio.to_thread(os.makedirs, os.path.dirname(metadata_path), exist_ok=True)
+                async with aiofiles.open(tmp_path, 'wb') as f:
+                    await f.write(body)
+                await asyncio.to_thread(os.replace, tmp_path, metadata_path)
+            except Exception:
+                # Keep the user dirty so the next flush retries the write
+                _dirty_users.add(user)
+                logger.exception("Failed to write metadata for %s; will retry on next flush", user)
+                return
+    finally:
+        _flush_tasks.pop(user, None)
+
+def _schedule_metadata_flush(user: str):
+    """Persist a user's metadata in the background, coalescing bursts of writes"""
+    _dirty_users.add(user)
+    if user not in _flush_tasks:
+        _flush_tasks[user] = asyncio.create_task(_flush_metadata(user))
+
+# Top-level static files are read once and served from memory.
+# Set COOKBOOKER_DEV=1 to re-read them on every request while editing.
+_STATIC_RELOAD = os.getenv("COOKBOOKER_DEV") == "1"
+# path -> (content, ETag)
+_static_cache: Dict[str, Tuple[bytes, str]] = {}
+
+async def _static_response(request: Request, path: str, media_type: str) -> Response:
+    """Serve a small static file from memory with browser caching enabled"""
+    cached = None if _STATIC_RELOAD else _static_cache.get(path)
+    if cached is None:
+        try:
+            async with aiofiles.open(path, 'rb') as f:
+                content = await f.read()
+        except FileNotFoundError:
+            raise HTTPException(status_code=404, detail=f"{path} not found")
+        cached = (content, f'"{hashlib.sha1(content).hexdigest()}"')
+        if not _STATIC_RELOAD:
+            _static_cache[path] = cached
+    content, etag = cached
+    headers = {
+        "Cache-Control": "no-cache" if _STATIC_RELOAD else "public, max-age=60",
+        "ETag": etag,
+    }
+    # Let browsers revalidate with a 304 instead of re-downloading
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=content, media_type=media_type, headers=headers)
+
 @app.get("/")
-async def serve_index():
+async def serve_index(request: Request):
     """Serve the main HTML file"""
-    return FileResponse("index.html")
+    return await _static_response(request, "index.html", "text/html")
 
 @app.get("/session")
 async def get_session():
@@ -118,19 +264,12 @@ async def save_recipe(request: UserRecipeSaveRequest):
     try:
         # Ensure user recipes directory exists
         user_recipes_dir = f"../database/users/{request.user}/recipes"
-        os.makedirs(user_recipes_dir, exist_ok=True)
+        await asyncio.to_thread(os.makedirs, user_recipes_dir, exist_ok=True)
         
         # Write recipe file
         file_path = os.path.join(user_recipes_dir, request.filename)
-        with open(file_path, 'w', encoding='utf-8') as f:
-            f.write(request.data)
-        
-        # Parse recipe data to extract info for Redis
-        recipe_data = json.loads(request.data)
-        recipe_name = recipe_data.get('name', 'Unnamed Recipe')
-        recipe_id = recipe_data.get('id', request.filename.replace('.json', ''))
-        
-        # Recipe creation tracking removed (was Redis-based)
+        async with aiofiles.open(file_path, 'wb') as f:
+            await f.write(orjson.dumps(request.data, option=orjson.OPT_INDENT_2))
         
         return {"success": True, "message": f"Recipe saved to {file_path}", "user": request.user}
     
@@ -140,44 +279,28 @@ async def save_recipe(request: UserRecipeSaveRequest):
 @app.post("/api/update-metadata")
 async def update_metadata(entry: MetadataUpdateRequest):
     """Update the user-specific metadata registry with a new recipe entry"""
-    user_recipes_dir = f"../database/users/{entry.user}/recipes"
-    os.makedirs(user_recipes_dir, exist_ok=True)
-    metadata_path = os.path.join(user_recipes_dir, "metadata.json")
+    payload = entry.model_dump()
     
     # Load existing metadata or create new
-    if os.path.exists(metadata_path):
-        with open(metadata_path, 'r', encoding='utf-8') as f:
-            metadata = json.load(f)
-    else:
-        metadata = {"recipes": [], "user": entry.user}
-    
-    # Add or update recipe entry
-    existing_index = next((i for i, recipe in enumerate(metadata["recipes"]) if recipe["id"] == entry.id), None)
+    _, recipes = await _load_metadata(entry.user, create=True)
     
-    if existing_index is not None:
-        metadata["recipes"][existing_index] = entry.dict()
-    else:
-        metadata["recipes"].append(entry.dict())
+    # Add or update recipe entry (existing entries keep their position)
+    recipes[entry.id] = payload
     
     # Save updated metadata
-    with open(metadata_path, 'w', encoding='utf-8') as f:
-        json.dump(metadata, f, indent=2, ensure_ascii=False)
+    _schedule_metadata_flush(entry.user)
     
     return {"status": "success", "message": "Metadata updated successfully", "user": entry.user}
 
 @app.get("/api/recipes/{user}")
 async def get_recipes(user: str):
     """Get all saved recipes for a specific user"""
-    user_recipes_dir = f"../database/users/{user}/recipes"
-    metadata_path = os.path.join(user_recipes_dir, "metadata.json")
-    
-    if not os.path.exists(metadata_path):
-        return {"recipes": [], "user": user}
-    
     try:
-        with open(metadata_path, 'r', encoding='utf-8') as f:
-            metadata = json.load(f)
-        return {"recipes": metadata.get("recipes", []), "user": user}
+        cached = await _load_metadata(user)
+        recipes = list(cached[1].values()) if cached is not None else []
+        # Serialize directly; skips FastAPI's jsonable_encoder pass over the whole list
+        body = orjson.dumps({"recipes": recipes, "user": user})
+        return Response(content=body, media_type="application/json")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to load recipes: {str(e)}")
 
@@ -187,45 +310,40 @@ async def get_recipe(user: str, recipe_id: str):
     user_recipes_dir = f"../database/users/{user}/recipes"
     recipe_path = os.path.join(user_recipes_dir, f"{recipe_id}.json")
     
-    if not os.path.exists(recipe_path):
-        raise HTTPException(status_code=404, detail="Recipe not found")
-    
     try:
-        with open(recipe_path, 'r', encoding='utf-8') as f:
-            recipe = json.load(f)
-        return recipe
+        # Recipe files are already JSON, so return the bytes as-is
+        async with aiofiles.open(recipe_path, 'rb') as f:
+            raw = await f.read()
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Recipe not found")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to load recipe: {str(e)}")
+    
+    return Response(content=raw, media_type="application/json")
 
 @app.delete("/api/delete-recipe")
 async def delete_recipe(request: RecipeDeleteRequest):
     """Delete a recipe for a specific user"""
     user_recipes_dir = f"../database/users/{request.user}/recipes"
     recipe_path = os.path.join(user_recipes_dir, request.filename)
-    metadata_path = os.path.join(user_recipes_dir, "metadata.json")
     
-    # Check if recipe file exists
-    if not os.path.exists(recipe_path):
+    try:
+        # Delete the recipe file
+        await asyncio.to_thread(os.remove, recipe_path)
+    except FileNotFoundError:
         raise HTTPException(status_code=404, detail="Recipe file not found")
+    except OSError as e:
+        raise HTTPException(status_code=500, detail=f"Failed to delete recipe: {str(e)}")
     
     try:
-        # Delete the recipe file
-        os.remove(recipe_path)
-        
         # Update metadata.json to remove the recipe entry
-        if os.path.exists(metadata_path):
-            with open(metadata_path, 'r', encoding='utf-8') as f:
-                metadata = json.load(f)
-            
-            # Remove recipe from metadata
-            metadata["recipes"] = [
-                recipe for recipe in metadata["recipes"] 
-                if recipe["id"] != request.recipeId
-            ]
-            
+        cached = await _load_metadata(request.user)
+        # Remove recipe from metadata
+        removed = cached[1].pop(request.recipeId, None) if cached is not None else None
+        
+        if removed is not None:
             # Save updated metadata
-            with open(metadata_path, 'w', encoding='utf-8') as f:
-                json.dump(metadata, f, indent=2, ensure_ascii=False)
+            _schedule_metadata_flush(request.user)
         
         return {"status": "success", "message": "Recipe deleted successfully", "user": request.user}
         
@@ -236,17 +354,32 @@ async def delete_recipe(request: RecipeDeleteRequest):
 # USER MANAGEMENT & DAILY TRACKING ENDPOINTS
 # ============================================================================
 
+# (unix second, local ISO timestamp) for the last formatted second
+_LAST_ISO = (0, '')
+
+def _now_iso() -> str:
+    """Current local time as ISO 8601, formatted at most once per second"""
+    global _LAST_ISO
+    t = int(time.time())
+    cached = _LAST_ISO
+    if cached[0] != t:
+        # Swap the whole tuple so concurrent readers never see a mismatched pair
+        cached = _LAST_ISO = (t, datetime.fromtimestamp(t).isoformat())
+    return cached[1]
+
 @app.get("/api/user/{user}/daily")
 async def get_user_daily_data(user: str):
     """Get user's daily calorie and meal data"""
     # Redis removed - return default daily data
+    # Single clock read; the ISO string already starts with YYYY-MM-DD
+    now = _now_iso()
     return {
-        'date': datetime.now().strftime('%Y-%m-%d'),
+        'date': now[:10],
         'calories_budget': 1000,
         'calories_consumed': 0,
         'meals': [],
         'recipes_created': [],
-        'last_updated': datetime.now().isoformat()
+        'last_updated': now
     }
 
 @app.get("/api/user/{user}/profile")
@@ -255,7 +388,7 @@ async def get_user_profile(user: str):
     # Redis removed - return default profile
     return {
         'username': user,
-        'created': datetime.now().isoformat(),
+        'created': _now_iso(),
         'preferences': {
             'voice': 'ash',
             'language': 'en',
@@ -295,14 +428,14 @@ async def get_calories_remaining(user: str):
         raise HTTPException(status_code=500, detail=f"Failed to get calorie data: {str(e)}")
 
 @app.get("/app.js")
-async def serve_app_js():
+async def serve_app_js(request: Request):
     """Serve the JavaScript file"""
-    return FileResponse("app.js")
+    return await _static_response(request, "app.js", "application/javascript")
 
 @app.get("/styles.css")
-async def serve_styles():
+async def serve_styles(request: Request):
     """Serve the CSS file"""
-    return FileResponse("styles.css")
+    return await _static_response(request, "styles.css", "text/css")
 
 @app.get("/favicon.ico")
 async def serve_favicon():
@@ -368,97 +501,94 @@ Please provide a detailed nutritional analysis in JSON format with the following
 Base your analysis on standard nutritional databases. Be accurate and realistic with portions and servings."""
 
         # Make request to OpenAI API
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                "https://api.openai.com/v1/chat/completions",
-                headers={
-                    "Authorization": f"Bearer {openai_api_key}",
-                    "Content-Type": "application/json"
-                },
-                json={
-                    "model": "gpt-4",
-                    "messages": [
-                        {
-                            "role": "system",
-                            "content": "You are a professional nutritionist. Provide accurate nutritional analysis in the exact JSON format requested. Only respond with valid JSON."
-                        },
-                        {
-                            "role": "user", 
-                            "content": prompt
-                        }
-                    ],
-                    "temperature": 0.3,
-                    "max_tokens": 1000
-                }
-            )
-            
-            if response.status_code != 200:
-                print(f"OpenAI API error: {response.status_code} - {response.text}")
-                return await fallback_nutrition_estimation(ingredients)
-            
-            gpt_response = response.json()
-            nutrition_json = gpt_response['choices'][0]['message']['content']
+        response = await request.app.state.openai_client.post(
+            "https://api.openai.com/v1/chat/completions",
+            headers={
+                "Authorization": f"Bearer {openai_api_key}",
+                "Content-Type": "application/json"
+            },
+            json={
+                "model": "gpt-4o",
+                "messages": [
+                    {
+                        "role": "system",
+                        "content": "You are a professional nutritionist. Provide accurate nutritional analysis in the exact JSON format requested. Only respond with valid JSON."
+                    },
+                    {
+                        "role": "user", 
+                        "content": prompt
+                    }
+                ],
+                "temperature": 0.3,
+                "max_tokens": 1000,
+                "response_format": {"type": "json_object"}
+            }
+        )
+        
+        if response.status_code != 200:
+            print(f"OpenAI API error: {response.status_code} - {response.text}")
+            return await fallback_nutrition_estimation(ingredients)
+        
+        gpt_response = orjson.loads(response.content)
+        nutrition_json = gpt_response['choices'][0]['message']['content']
+        
+        try:
+            # Parse GPT response as JSON
+            nutrition_data = orjson.loads(nutrition_json)
+            nutrition_data['analysis_method'] = 'gpt4_analysis'
+            return nutrition_data
             
-            try:
-                # Parse GPT response as JSON
-                nutrition_data = json.loads(nutrition_json)
-                nutrition_data['analysis_method'] = 'gpt4_analysis'
-                return nutrition_data
-                
-            except json.JSONDecodeError:
-                print(f"Failed to parse GPT nutrition response: {nutrition_json}")
-                return await fallback_nutrition_estimation(ingredients)
+        except orjson.JSONDecodeError:
+            print(f"Failed to parse GPT nutrition response: {nutrition_json}")
+            return await fallback_nutrition_estimation(ingredients)
         
     except Exception as e:
         print(f"❌ Error analyzing nutrition with GPT: {e}")
         return await fallback_nutrition_estimation(ingredients)
 
+# Fallback nutrition tables, built once at import time
+# Grams per unit; units not listed are assumed to already be grams
+_UNIT_TO_GRAMS = {
+    'kg': 1000, 'kilogram': 1000,
+    'ml': 1, 'milliliter': 1,  # Assume 1ml = 1g for liquids
+    'l': 1000, 'liter': 1000,
+    'cup': 240, 'cups': 240,  # Approximate grams per cup
+    'tbsp': 15, 'tablespoon': 15,
+    'tsp': 5, 'teaspoon': 5,
+}
+_PIECE_UNITS = frozenset(['piece', 'pieces', 'item', 'items'])
+# Estimated weight per piece by ingredient type, first match wins
+_PIECE_WEIGHTS = (('egg', 50), ('onion', 150))
+_DEFAULT_PIECE_WEIGHT = 100
+# Basic calories per 100g, first match wins
+_KEYWORD_KCAL_PER_100G = (
+    ('flour', 350), ('bread', 350), ('pasta', 350), ('rice', 350),
+    ('butter', 750), ('oil', 750), ('fat', 750),
+    ('sugar', 400),
+    ('egg', 150),
+    ('milk', 60), ('cream', 60),
+    ('meat', 200), ('chicken', 200), ('beef', 200), ('pork', 200),
+)
+_DEFAULT_KCAL_PER_100G = 50  # Default for vegetables/misc
+
 async def fallback_nutrition_estimation(ingredients: List[Dict[str, Any]]) -> Dict[str, Any]:
     """Simple fallback nutrition estimation when GPT fails"""
     total_calories = 0
     
     for ingredient in ingredients:
         name = ingredient['name'].lower()
-        amount = ingredient['amount']
         unit = ingredient['unit'].lower()
         
         # Convert to grams if needed
-        if unit in ['kg', 'kilogram']:
-            amount *= 1000
-        elif unit in ['ml', 'milliliter']:
-            amount *= 1  # Assume 1ml = 1g for liquids
-        elif unit in ['l', 'liter']:
-            amount *= 1000
-        elif unit in ['cup', 'cups']:
-            amount *= 240  # Approximate grams per cup
-        elif unit in ['tbsp', 'tablespoon']:
-            amount *= 15
-        elif unit in ['tsp', 'teaspoon']:
-            amount *= 5
-        elif unit in ['piece', 'pieces', 'item', 'items']:
-            # Estimate based on ingredient type
-            if 'egg' in name:
-                amount *= 50  # Average egg weight
-            elif 'onion' in name:
-                amount *= 150
-            else:
-                amount *= 100  # Default piece weight
+        if unit in _PIECE_UNITS:
+            grams_per_unit = next((w for word, w in _PIECE_WEIGHTS if word in name), _DEFAULT_PIECE_WEIGHT)
+        else:
+            grams_per_unit = _UNIT_TO_GRAMS.get(unit, 1)
+        amount = ingredient['amount'] * grams_per_unit
         
         # Basic calorie estimation per 100g
-        if any(word in name for word in ['flour', 'bread', 'pasta', 'rice']):
-            total_calories += (amount / 100) * 350
-        elif any(word in name for word in ['butter', 'oil', 'fat']):
-            total_calories += (amount / 100) * 750
-        elif 'sugar' in name:
-            total_calories += (amount / 100) * 400
-        elif 'egg' in name:
-            total_calories += (amount / 100) * 150
-        elif any(word in name for word in ['milk', 'cream']):
-            total_calories += (amount / 100) * 60
-        elif any(word in name for word in ['meat', 'chicken', 'beef', 'pork']):
-            total_calories += (amount / 100) * 200
-        else:
-            total_calories += (amount / 100) * 50  # Default for vegetables/misc
+        kcal_per_100g = next((kcal for word, kcal in _KEYWORD_KCAL_PER_100G if word in name), _DEFAULT_KCAL_PER_100G)
+        total_calories += (amount / 100) * kcal_per_100g
     
     estimated_servings = max(1, len(ingredients) // 3)
     calories_per_serving = total_calories / estimated_servings
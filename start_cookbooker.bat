@@ -63,7 +63,7 @@ echo [INFO] Installing/updating dependencies...
 if exist "requirements.txt" (
     python -m pip install -r requirements.txt --quiet --disable-pip-version-check
 ) else (
-    python -m pip install fastapi uvicorn python-dotenv openai psutil httpx requests python-multipart --quiet --disable-pip-version-check
+    python -m pip install fastapi uvicorn python-dotenv psutil httpx[http2] orjson aiofiles python-multipart --quiet --disable-pip-version-check
 )
 
 if errorlevel 1 (
@@ -85,7 +85,7 @@ echo.
 
 REM Kill any existing processes on port 8000 first
 echo [INFO] Checking for existing processes on port 8000...
-python -c "import psutil; [proc.kill() for proc in psutil.process_iter(['pid', 'name', 'connections']) if any(hasattr(conn, 'laddr') and conn.laddr and conn.laddr.port == 8000 for conn in (proc.info['connections'] or []))]; print('[OK] Port 8000 cleared')" 2>nul
+python -c "from server import kill_process_on_port; kill_process_on_port(8000); print('[OK] Port 8000 cleared')"
 
 REM Start server and capture any immediate errors
 start /B python -m uvicorn server:app --host 0.0.0.0 --port 8000 --log-level warning